@@ -1,28 +1,64 @@
 #!/usr/bin/env python3
 
 import argparse
-from collections import Counter
+import atexit
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from functools import lru_cache
 import globus_sdk
-import http.client as httplib
+import ijson        # Picks the fastest available backend, yajl2_c when installed
 import json
 import logging
 import logging.handlers
+import mmap
+import numpy as np
 import os
 from pid import PidFile
 import pwd
-import random
+import queue
 import re
+from requests.adapters import HTTPAdapter
 import sys
 import shutil
 import signal
 import ssl
-from time import sleep
+from time import gmtime, sleep, time
 import traceback
+import urllib3
 from urllib.parse import urlparse
 
 import pdb
 
+# orjson parses/serializes the source payload several times faster than the stdlib
+try:
+    import orjson
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    json_loads = json.loads
+    def json_dumps(obj):
+        return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+@lru_cache(maxsize=128)
+def valid_url(url):
+    # Only validates, urllib3 parses the URL itself; cached since the same URLs are checked every refresh
+    urlp = urlparse(url)
+    return(urlp.scheme in ('http', 'https') and bool(urlp.netloc) and bool(urlp.path))
+
+# Batches are ingested as a GMetaList document wrapped around already serialized entries
+_GMETALIST_PREFIX = b'{"ingest_type":"GMetaList","ingest_data":{"gmeta":['
+_GMETALIST_SUFFIX = b']}}'
+
+# Expected daemon stdout contents that don't need to be saved
+_STARTED_RE = re.compile(r'^started with pid \d+$')
+_EMPTY_RE = re.compile(r'^$')
+_DAEMON_STDOUT_PEEK = 4096
+
+# Raised while streaming a source that turns out to be unavailable, truncated, or invalid
+class SourceError(Exception):
+    pass
+
 # Used during initialization before loggin is enabled
 def eprint(*args, **kwargs):
     print(*args, file=sys.stderr, **kwargs)
@@ -81,7 +117,13 @@ class Router():
         self.handler = logging.handlers.TimedRotatingFileHandler(self.config['LOG_FILE'], \
             when='W6', backupCount=999, utc=True)
         self.handler.setFormatter(self.formatter)
-        self.logger.addHandler(self.handler)
+        # Callers only enqueue records, a background listener formats, writes, and rotates
+        # SimpleQueue.put is reentrant, so exit_signal can still log safely
+        self.log_queue = queue.SimpleQueue()
+        self.logger.addHandler(logging.handlers.QueueHandler(self.log_queue))
+        self.log_listener = logging.handlers.QueueListener(self.log_queue, self.handler)
+        self.log_listener.start()
+        atexit.register(self.log_listener.stop)        # Flush queued log records on any exit
 
         # Initialize stdout, stderr
         if self.args.daemon and 'LOG_FILE' in self.config:
@@ -105,6 +147,28 @@ class Router():
         self.peak_sleep = 10 * 60        # 10 minutes in seconds during peak business hours
         self.off_sleep = 60 * 60         # 60 minutes in seconds during off hours
         self.max_stale = 24 * 60 * 60    # 24 hours in seconds force refresh
+        self.half_day = 12 * 60 * 60     # 12 hours in seconds, refresh at Noon and Midnight UTC
+        # Frequently used configuration values
+        self.cider_last_url = self.config.get('CIDER_LAST_URL')
+        # Validators and parsed body from the last CIDER_LAST_URL response
+        self.cider_etag = None
+        self.cider_last_modified = None
+        self.cider_ts_json = None
+        # Batch ingests run in the background, Warehouse_Wait collects them
+        self.ingest_workers = 4
+        self.ingest_pool = ThreadPoolExecutor(max_workers=self.ingest_workers)
+        self.ingest_futures = deque()
+        self.ingest_max_pending = 4         # Batches queued or in flight before entry building waits
+        # Source HTTP connections are pooled and reused across refreshes
+#        self.ssl_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+#   2022-10-21 JP - figure out later the appropriate level of ssl verification
+        self.ssl_ctx = ssl.create_default_context()
+        # Bounded waits so a stalled source or CIDER server can't block the refresh loop
+        self.http = urllib3.PoolManager(ssl_context=self.ssl_ctx, maxsize=4, \
+            timeout=urllib3.Timeout(connect=10, read=60))
+        self.source_headers = {'Content-type': 'application/json',
+                               'XA-CLIENT': self.config.get('AFFILIATIONS', ['ACCESS'])[0],
+                               'XA-KEY-FORMAT': 'underscore'}
         # These attributes have their own database column
         # Some fields exist in both parent and sub-resources, while others only in one
         # Those in one will be left empty in the other, or inherit from the parent
@@ -148,7 +212,11 @@ class Router():
             sys.exit(1)
         self.dest['uri'] = self.args.dest
         if self.dest['scheme'] == 'index':
-            self.dest['display'] = '{}@uuid={}'.format(self.dest['scheme'], self.config.get('INDEX'))
+            # Required, and only needed, when loading the index
+            self.index = self.config['INDEX']
+            self.client_id = self.config['GLOBUS_CLIENT_ID']
+            self.client_secret = self.config['GLOBUS_CLIENT_SECRET']
+            self.dest['display'] = '{}@uuid={}'.format(self.dest['scheme'], self.index)
         else:
             self.dest['display'] = self.args.dest
 
@@ -173,10 +241,14 @@ class Router():
     def SaveDaemonStdOut(self, path):
         # Save daemon log file using timestamp only if it has anything unexpected in it
         try:
-            file = open(path, 'r')
-            lines = file.read()
-            file.close()
-            if not re.match("^started with pid \d+$", lines) and not re.match("^$", lines):
+            size = os.path.getsize(path)
+            if size == 0:
+                return
+            lines = None
+            if size <= _DAEMON_STDOUT_PEEK:     # Anything larger can't be just the expected line
+                with open(path, 'r') as file:
+                    lines = file.read(_DAEMON_STDOUT_PEEK)
+            if lines is None or (not _STARTED_RE.match(lines) and not _EMPTY_RE.match(lines)):
                 ts = datetime.strftime(datetime.now(), '%Y-%m-%d_%H:%M:%S')
                 newpath = '{}.{}'.format(path, ts)
                 self.logger.debug('Saving previous daemon stdout to {}'.format(newpath))
@@ -194,77 +266,144 @@ class Router():
             self.logger.error('Exiting with rc={}'.format(rc))
         sys.exit(rc)
 
-    def Retrieve_Source(self, url):
-        urlp = urlparse(url)
-        if not urlp.scheme or not urlp.netloc or not urlp.path:
+    def Open_Source(self, url, headers=None):
+        if not valid_url(url):
             self.logger.error('Source URL is not valid: {}'.format(url))
             sys.exit(1)
-        if urlp.scheme not in ['http', 'https']:
-            self.logger.error('Source URL scheme is not valid: {}'.format(url))
-            sys.exit(1)
-        if ':' in urlp.netloc:
-            (host, port) = urlp.netloc.split(':')
-        else:
-            (host, port) = (urlp.netloc, '')
-        if not port:
-            port = '80' if urlp.scheme == 'http' else '443'     # Default is HTTPS/443
-        
-        headers = {'Content-type': 'application/json',
-                    'XA-CLIENT': affiliation,
-                    'XA-KEY-FORMAT': 'underscore'}
-#        ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-#   2022-10-21 JP - figure out later the appropriate level of ssl verification
-        ctx = ssl.create_default_context()
-        conn = httplib.HTTPSConnection(host=host, port=port, context=ctx)
-        conn.request('GET', urlp.path, None , headers)
+        # Pooled keep-alive connections skip the TCP and TLS handshake on repeat requests
+        response = self.http.request('GET', url, headers={**self.source_headers, **(headers or {})}, preload_content=False)
         self.logger.debug('HTTP GET  {}'.format(url))
-        response = conn.getresponse()
+        self.logger.debug('HTTP RESP {} {}'.format(response.status, response.reason))
+        return(response)
+
+    def Retrieve_Source(self, url):
+        response = self.Open_Source(url)
         data = response.read()
-        self.logger.debug('HTTP RESP {} {} (returned {}/bytes)'.format(response.status, response.reason, len(data)))
+        response.release_conn()
+        if response.status != 200:
+            self.logger.error('Source URL returned HTTP {} {}'.format(response.status, response.reason))
+            return(None)
+        self.logger.debug('HTTP RESP returned {}/bytes'.format(len(data)))
         try:
-            data_json = json.loads(data)
+            data_json = json_loads(data)
         except ValueError as e:
             self.logger.error('Response not in expected JSON format ({})'.format(e))
             return(None)
             
-        self.logger.debug('Retrieved and parsed {}/bytes from URL'.format(len(results)))
+        self.logger.debug('Retrieved and parsed {}/bytes from URL'.format(len(data)))
         return(data_json)
 
+    def Retrieve_Affiliation_Infrastructure(self, url):
+        # Conditional GET that reuses the last parsed response when the server reports it unchanged
+        headers = {}
+        if self.cider_etag:
+            headers['If-None-Match'] = self.cider_etag
+        if self.cider_last_modified:
+            headers['If-Modified-Since'] = self.cider_last_modified
+        try:
+            response = self.Open_Source(url, headers=headers)
+            data = response.read()
+            response.release_conn()
+        except urllib3.exceptions.HTTPError as e:   # Best effort, the next wake tries again
+            self.logger.error('Error retrieving CIDER last update URL ({})'.format(e))
+            return(None)
+        if response.status == 304 and self.cider_ts_json is not None:
+            self.logger.debug('Not modified since last retrieval, reusing parsed response')
+            return(self.cider_ts_json)
+        if response.status != 200:
+            self.logger.error('CIDER last update URL returned HTTP {} {}'.format(response.status, response.reason))
+            return(None)
+        try:
+            ts_json = json_loads(data)
+        except ValueError as e:
+            self.logger.error('Response not in expected JSON format ({})'.format(e))
+            return(None)
+        self.cider_etag = response.headers.get('ETag')
+        self.cider_last_modified = response.headers.get('Last-Modified')
+        self.cider_ts_json = ts_json
+        return(ts_json)
+
+    def Stream_Source(self, url):
+        # Yields one parent resource at a time without buffering the whole response,
+        # raising SourceError so that a failed or truncated response is never treated as complete
+        try:
+            response = self.Open_Source(url)
+        except urllib3.exceptions.HTTPError as e:
+            raise SourceError('Error requesting source URL ({})'.format(e))
+        count = 0
+        try:
+            if response.status != 200:
+                raise SourceError('Source URL returned HTTP {} {}'.format(response.status, response.reason))
+            for item in self.Parse_Results(response):
+                count += 1
+                yield item
+        except ijson.JSONError as e:
+            raise SourceError('Response not in expected JSON format ({})'.format(e))
+        except urllib3.exceptions.HTTPError as e:      # Connection dropped or timed out mid-body
+            raise SourceError('Error reading source URL ({})'.format(e))
+        finally:
+            response.release_conn()
+        self.logger.debug('Retrieved and parsed {}/results from URL'.format(count))
+
+    def Parse_Results(self, source):
+        # Yields each entry of the top level 'results' array, raising SourceError if there is no such array
+        seen = False
+        def events():
+            nonlocal seen
+            for event in ijson.parse(source, use_float=True):
+                if not seen and event[0] == 'results' and event[1] == 'start_array':
+                    seen = True
+                yield event
+        yield from ijson.items(events(), 'results.item')
+        if not seen:
+            raise SourceError('JSON has no "results" array')
+
     def Analyze_Info(self, data_json):
         return
 
     def Write_Cache(self, file, data_json):
-        data = json.dumps(data_json)
-        with open(file, 'w') as my_file:
+        data = json_dumps(data_json)
+        with open(file, 'wb') as my_file:
             my_file.write(data)
             my_file.close()
         self.logger.info('Serialized and wrote {} bytes to file={}'.format(len(data), file))
         return(len(data))
 
     def Read_Cache(self, file):
-        with open(file, 'r') as my_file:
-            data = my_file.read()
-            my_file.close()
-        try:
-            data_json = json.loads(data)
-            self.logger.info('Read and parsed {}/bytes of json from file={}'.format(len(data), file))
-            return(data_json)
-        except ValueError as e:
-            self.logger.error('Error "{}" parsing file={}'.format(e, file))
-            sys.exit(1)
+        # Yields one parent resource at a time, parsing straight from the memory mapped file,
+        # raising SourceError so that a truncated or invalid file is never treated as complete
+        count = 0
+        with open(file, 'rb') as my_file:
+            try:
+                with mmap.mmap(my_file.fileno(), 0, access=mmap.ACCESS_READ) as my_map:
+                    for item in self.Parse_Results(my_map):
+                        count += 1
+                        yield item
+            except (ijson.JSONError, ValueError) as e:  # ValueError from mmap of an empty file
+                raise SourceError('Error "{}" parsing file={}'.format(e, file))
+        self.logger.info('Read and parsed {}/results of json from file={}'.format(count, file))
+
+    def Random_Picks(self, highs, block=1000):
+        # Yields a row of random indexes, one per high, drawing a block of rows per numpy call
+        rng = np.random.default_rng()
+        while True:
+            yield from rng.integers(0, highs, size=(block, len(highs))).tolist()
 
-    def Warehouse_Info(self, data_json):
+    def Warehouse_Info(self, results):
         self.cur = {}   # Existing items
         self.new = {}   # New items
         
         confidential_client = globus_sdk.ConfidentialAppAuthClient(
-            client_id=self.config['GLOBUS_CLIENT_ID'], client_secret=self.config['GLOBUS_CLIENT_SECRET']
+            client_id=self.client_id, client_secret=self.client_secret
         )
 
         scopes = 'urn:globus:auth:scope:search.api.globus.org:ingest urn:globus:auth:scope:search.api.globus.org:search'
         cc_authorizer = globus_sdk.ClientCredentialsAuthorizer(confidential_client, scopes)
 
         self.client = globus_sdk.SearchClient(authorizer=cc_authorizer, app_name='uiuc_training_load')
+        # Keep a pooled keep-alive connection for every concurrent ingest worker
+        self.client.transport.session.mount('https://', HTTPAdapter(pool_connections=self.ingest_workers, \
+            pool_maxsize=self.ingest_workers))
         
         query_string = {
             'q': 'user query',
@@ -272,7 +411,7 @@ class Router():
             'facets': [ ],
             'sort': [ ]
         }
-        result = self.client.search(self.config['INDEX'], query_string)
+        result = self.client.search(self.index, query_string)
         
 #        for item in CiderInfrastructure.objects.all():
 #            self.cur[item.cider_resource_id] = item
@@ -289,51 +428,63 @@ class Router():
         EXPERTISE_LEN = len(EXPERTISE)
         DURATION = [30, 60, 90, 120, 240, 360, 480]
         DURATION_LEN = len(DURATION)
-        for p_res in data_json['results']:  # Iterating over parent resources
-            try:
-                if p_res['EntityJSON']['import_source'] != 'Lynda.com':
+        RATING_LEN = 51                 # Ratings 0.0 to 5.0 in tenths
+        # Fields that are the same in every entry, shared rather than rebuilt per record
+        VISIBLE_TO = ['public']
+        STATIC_CONTENT = {
+            'Authors': [],
+            'Language': 'en',
+            'Keywords': ['linda'],
+            'Resource_URL_Type': 'URL',
+            'Provider_ID': PROVIDER
+        }
+        start_iso = datetime.now(timezone.utc).isoformat()    # Shared ingest timestamp
+        picks = self.Random_Picks([TARGET_LEN, TYPES_LEN, OUTCOMES_LEN, EXPERTISE_LEN, RATING_LEN, DURATION_LEN])
+        try:
+            for p_res in results:  # Iterating over parent resources
+                EJ = p_res.get('EntityJSON')
+                if not EJ or EJ.get('import_source') != 'Lynda.com':
                     continue
-            except:
-                continue
-            EJ = p_res['EntityJSON']
-            entry = {
-                'subject': p_res['ID'],
-                'visible_to': ['public'],
-#                'entry_id': 'std',
-                'content': {
-                    'Title': EJ['resource_name'],
-                    'Abstract': EJ['resource_description'],
-                    'Version_Date': p_res['CreationTime'],
-                    'Authors': [],
-                    'Language': 'en',
-                    'Keywords': ['linda'],
-                    'URL': EJ['resource_website'],
-                    'Resource_URL_Type': 'URL',
-                    'License': EJ['data_license'],
-                    'Cost': EJ['cost_description'],
-                    'Target_Group': [TARGET[random.randint(0,TARGET_LEN-1)]],
-                    'Learning_Resource_Type': TYPES[random.randint(0,TYPES_LEN-1)],
-                    'Learning_Outcome': [OUTCOMES[random.randint(0,OUTCOMES_LEN-1)]],
-                    'Expertise_Level': [EXPERTISE[random.randint(0,EXPERTISE_LEN-1)]],
-                    'Rating': random.randint(0, 50) / 10,
-                    'Provider_ID': PROVIDER,
-                    'Start_Datetime': datetime.now().isoformat(),
-                    'Duration': DURATION[random.randint(0,DURATION_LEN-1)]
-                },
-            }
-            self.Warehouse_Entry(entry, batch=1000)
+                (t_idx, ty_idx, o_idx, e_idx, rating, d_idx) = next(picks)
+                entry = {
+                    'subject': p_res['ID'],
+                    'visible_to': VISIBLE_TO,
+#                    'entry_id': 'std',
+                    'content': {
+                        **STATIC_CONTENT,
+                        'Title': EJ['resource_name'],
+                        'Abstract': EJ['resource_description'],
+                        'Version_Date': p_res['CreationTime'],
+                        'URL': EJ['resource_website'],
+                        'License': EJ['data_license'],
+                        'Cost': EJ['cost_description'],
+                        'Target_Group': [TARGET[t_idx]],
+                        'Learning_Resource_Type': TYPES[ty_idx],
+                        'Learning_Outcome': [OUTCOMES[o_idx]],
+                        'Expertise_Level': [EXPERTISE[e_idx]],
+                        'Rating': rating / 10,
+                        'Start_Datetime': start_iso,
+                        'Duration': DURATION[d_idx]
+                    },
+                }
+                self.Warehouse_Entry(entry, batch=1000)
             
-#            if p_res['ID'] not in self.cur:
-#                self.client.create_entry(
-#                    self.config['INDEX'],
-#                    entry
-#                    )
-#            else:
-#                self.client.update_entry(
-#                    self.config['INDEX'],
-#                    entry
-#                    )
-            self.new[p_res['ID']] = True
+#                if p_res['ID'] not in self.cur:
+#                    self.client.create_entry(
+#                        self.config['INDEX'],
+#                        entry
+#                        )
+#                else:
+#                    self.client.update_entry(
+#                        self.config['INDEX'],
+#                        entry
+#                        )
+                self.new[p_res['ID']] = True
+        except SourceError as e:
+            # Ingest nothing more from an incomplete source, but let batches already submitted finish
+            self.entry_batch = []
+            self.Warehouse_Wait()
+            return(False, str(e))
 
 #        for id in self.cur:
 #            if id not in self.new:
@@ -348,11 +499,11 @@ class Router():
  
  # Call with batch=1 to update single entry
  # Otherwise ingest by batch, use batch=0 for final flush
-    def Warehouse_Entry(self, entry, batch=100, flush=False):
+    def Warehouse_Entry(self, entry, batch=1000, flush=False):
         if entry and batch == 1:
             try:
-                self.client.update_entry(self.config['INDEX'], entry)
-                self.STATS.update({'Update'})
+                self.client.update_entry(self.index, entry)
+                self.STATS['Update'] += 1
             except globus_sdk.GlobusAPIError as e:
                 self.logger.error(f'Globus API error: code={e.code}, message={e.message}')
                 if e.errors:
@@ -363,75 +514,101 @@ class Router():
 
         if not hasattr(self, 'entry_batch'):            # Define buffer if needed
             self.entry_batch = []
-        if entry:                                       # Add entry to buffer
-            self.entry_batch.append(entry)
-        if len(self.entry_batch) < 1:                   # Nothing in buffer
-            return
-        if len(self.entry_batch) < batch:               # Buffer entry
-            return
-        # Buffer is full or flush when batch=0
-        ingest_data = {
-            'ingest_type': 'GMetaList',
-            'ingest_data': {
-                'gmeta': self.entry_batch
-            }
-        }
-        try:
-            self.client.ingest(self.config['INDEX'], ingest_data)
-        except globus_sdk.GlobusAPIError as e:
-            self.logger.error(f'Globus API error: code={e.code}, message={e.message}')
-            if e.errors:
-                sub = ';'.join([f'code={sub.code}, message={sub.message}' for sub in e.errors])
-                self.logger.error(f'Globus API sub-errors: {sub}')
-            raise e
-        self.STATS.update({'Update': len(self.entry_batch)})
-        self.logger.debug(f'Updated {len(self.entry_batch)} items')
-        self.entry_batch = []
+        if entry:                                       # Add serialized entry to buffer
+            self.entry_batch.append(json_dumps(entry))
+        if self.entry_batch and len(self.entry_batch) >= batch:
+            # Buffer is full or flush when batch=0, ingest in the background while the next batch builds
+            ingest_data = _GMETALIST_PREFIX + b','.join(self.entry_batch) + _GMETALIST_SUFFIX
+            future = self.ingest_pool.submit(self.Warehouse_Ingest, ingest_data)
+            self.ingest_futures.append((future, len(self.entry_batch)))
+            self.entry_batch = []
+            self.Warehouse_Wait(pending=self.ingest_max_pending)   # Stop building when too far ahead
+        if batch == 0:
+            self.Warehouse_Wait()
+        return
+
+    def Warehouse_Ingest(self, ingest_data):
+        # Runs in an ingest worker, POSTing the already serialized batch as-is through the SearchClient
+        # transport, which keeps its pooled connections, timeout, retries, and token renewal
+        return(self.client.post(f'/v1/index/{self.index}/ingest', data=ingest_data, \
+            headers={'Content-Type': 'application/json'}, encoding='text'))
+
+    def Warehouse_Wait(self, pending=0):
+        # Wait for the oldest in-flight batch ingests until at most pending remain,
+        # raising the first error after all of those have completed
+        error = None
+        while len(self.ingest_futures) > pending:
+            (future, count) = self.ingest_futures.popleft()
+            try:
+                future.result()
+            except globus_sdk.GlobusAPIError as e:
+                self.logger.error(f'Globus API error: code={e.code}, message={e.message}')
+                if e.errors:
+                    sub = ';'.join([f'code={sub.code}, message={sub.message}' for sub in e.errors])
+                    self.logger.error(f'Globus API sub-errors: {sub}')
+                error = error or e
+                continue
+            except (globus_sdk.NetworkError, OSError) as e:
+                self.logger.error(f'Globus ingest network error: {type(e).__name__}: {e}')
+                error = error or e
+                continue
+            self.STATS['Update'] += count
+            self.logger.debug(f'Updated {count} items')
+        if error:
+            raise error
         return
         
-    def smart_sleep(self, last_run):
+    def smart_sleep(self, last_run_ts):
         # This functions sleeps, performs refresh checks, and returns when it's time to refresh
         while True:
-            if 12 <= datetime.now(timezone.utc).hour <= 24: # Between 6 AM and 6 PM Central (~12 to 24 UTC)
+            if 12 <= gmtime().tm_hour: # Between 6 AM and 6 PM Central (~12 to 24 UTC)
                 current_sleep = self.peak_sleep
             else:
                 current_sleep = self.off_sleep
             self.logger.debug('sleep({})'.format(current_sleep))
             sleep(current_sleep)
 
-            # Force a refresh every 12 hours at Noon and Midnight UTC
-            now_utc = datetime.now(timezone.utc)
-            if ( (now_utc.hour < 12 and last_run.hour > 12) or \
-                (now_utc.hour > 12 and last_run.hour < 12) ):
+            # Force a refresh every 12 hours at Noon and Midnight UTC, when now is in a later half day
+            now_ts = time()
+            if now_ts // self.half_day > last_run_ts // self.half_day:
                 self.logger.info('REFRESH TRIGGER: Every 12 hours')
                 return
 
             # Force a refresh every max_stale seconds
-            since_last_run = now_utc - last_run
-            if since_last_run.seconds > self.max_stale:
-                self.logger.info('REFRESH TRIGGER: Stale {}/seconds above thresdhold of {}/seconds'.format(since_last_run.seconds, self.max_stale) )
+            since_last_run = now_ts - last_run_ts
+            if since_last_run > self.max_stale:
+                self.logger.info('REFRESH TRIGGER: Stale {:.0f}/seconds above thresdhold of {}/seconds'.format(since_last_run, self.max_stale) )
                 return
 
             # If recent database update
-            if 'CIDER_LAST_URL' in self.config and self.config['CIDER_LAST_URL']:
-                ts_json = self.Retrieve_Affiliation_Infrastructure(self.config['CIDER_LAST_URL'])
+            if not self.cider_last_url:
+                continue
+            ts_json = self.Retrieve_Affiliation_Infrastructure(self.cider_last_url)
+            if ts_json is None:                         # Already logged, check again on the next wake
+                continue
             try:
-                last_db_update = parse_datetime(ts_json['last_update_time'])
-                self.logger.info('Last DB update at {} with last refresh at {}'.format(last_db_update, last_run))
-                if last_db_update > last_run:
+                last_db_update = datetime.fromisoformat(ts_json['last_update_time'].replace('Z', '+00:00'))
+                if last_db_update.tzinfo is None:      # Without an offset the time is UTC, not local
+                    last_db_update = last_db_update.replace(tzinfo=timezone.utc)
+                self.logger.info('Last DB update at {} with last refresh at {}'.format(last_db_update, datetime.fromtimestamp(last_run_ts, timezone.utc)))
+                if last_db_update.timestamp() > last_run_ts:
                     self.logger.info('REFRESH TRIGGER: DB update since last run')
                     return
             except Exception as e:
-                self.logger.error('{} parsing last_update_time={}: {}'.format(type(e).__name__, ts_json['last_update_time'], e.message))
+                self.logger.error('{} parsing last_update_time: {}'.format(type(e).__name__, e))
                 last_db_update = None
 
     def Run(self):
         while True:
             self.start = datetime.now(timezone.utc)
+            self.last_run_ts = time()
             self.STATS = Counter()
+            rc = True
             
             if self.src['scheme'] == 'file':
                 RAW = self.Read_Cache(self.src['path'])
+            elif self.dest['scheme'] == 'index':
+                RAW = self.Stream_Source(self.src['uri'])
             else:
                 RAW = self.Retrieve_Source(self.src['uri'])
 
@@ -445,10 +622,14 @@ class Router():
                 
                 self.end = datetime.now(timezone.utc)
                 summary_msg = 'Processed in {:.3f}/seconds: {}/updates, {}/deletes, {}/skipped'.format((self.end - self.start).total_seconds(), self.STATS['Update'], self.STATS['Delete'], self.STATS['Skip'])
-                self.logger.info(summary_msg)
+                if rc:
+                    self.logger.info(summary_msg)
+                else:
+                    self.logger.error('Failed, {}. {}'.format(process_message, summary_msg))
             if not self.args.daemonaction:
                 break
-            self.smart_sleep(self.start)
+            self.smart_sleep(self.last_run_ts)
+        return(0 if rc else 1)
 
 ########## CUSTOMIZATIONS END ##########
 